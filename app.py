@@ -1,24 +1,56 @@
 # app.py
+import os
 import streamlit as st
-from rag_chat import generate_answer
+
+# Number of most recent messages rendered on each rerun; older ones are paged in on demand
+HISTORY_WINDOW = max(1, int(os.getenv("HISTORY_WINDOW", "20")))
 
 st.set_page_config(page_title="Patient Support Assistant", layout="centered")
 
+
+@st.cache_resource(show_spinner=False)
+def load_assistant():
+    """Import the RAG pipeline (openai, pinecone, embedder) once per server process and warm its clients."""
+    # Deferred import: reruns that only redraw the page never pay for the heavy dependencies
+    import rag_chat
+    from retriever import get_index
+
+    get_index()
+    return rag_chat.generate_answer
+
+
+def render_message(msg):
+    with st.chat_message("user" if msg["role"] == "user" else "assistant"):
+        st.write(msg["content"])
+
+
+def show_earlier_messages():
+    st.session_state.history_pages += 1
+
+
 st.title("💙 Patient Support Assistant")
 st.markdown("Chat with your AI patient support assistant (RAG-powered).")
 
 # Initialize chat history
 if "messages" not in st.session_state:
     st.session_state.messages = []
+if "history_pages" not in st.session_state:
+    st.session_state.history_pages = 1
 
-# Display chat history
-for msg in st.session_state.messages:
-    if msg["role"] == "user":
-        with st.chat_message("user"):
-            st.write(msg["content"])
-    else:
-        with st.chat_message("assistant"):
-            st.write(msg["content"])
+# Display chat history: only the latest window(s), with a button to page in older messages
+messages = st.session_state.messages
+visible = HISTORY_WINDOW * st.session_state.history_pages
+hidden = max(len(messages) - visible, 0)
+
+if hidden:
+    st.button(
+        f"Show earlier messages ({hidden} hidden)",
+        on_click=show_earlier_messages,
+        use_container_width=True,
+    )
+
+for msg in messages[hidden:]:
+    render_message(msg)
 
 # Chat input box
 if prompt := st.chat_input("Type your question..."):
@@ -36,6 +68,7 @@ if prompt := st.chat_input("Type your question..."):
 
         # show the spinner only (this will be visible while the model runs)
         with st.spinner("Analyzing with patient support knowledge base..."):
+            generate_answer = load_assistant()
             response = generate_answer(prompt, st.session_state.messages)
 
         # replace the empty placeholder with the final response (single in-place update, no duplicate)
@@ -43,4 +76,3 @@ if prompt := st.chat_input("Type your question..."):
 
     # Save assistant reply
     st.session_state.messages.append({"role": "assistant", "content": response})
-
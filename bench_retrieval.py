@@ -0,0 +1,239 @@
+"""
+Retrieval quality and latency benchmark over the labeled queries in bench_queries.json.
+
+Each query goes through a rewrite step (the LLM rewrite from rag_chat, or an identity stub)
+and then retriever.retrieve_similar_chunks against the configured backend. Reports recall@k,
+MRR, context token counts and latency percentiles, and diffs two saved runs.
+
+Usage:
+  python bench_retrieval.py run [--top-k 5] [--rewrite none|llm] [--backend pinecone|local]
+                                [--embedder MODEL] [--repeat 3] [--out results.json]
+  python bench_retrieval.py diff baseline.json candidate.json
+
+Fully offline and deterministic:
+  python bench_retrieval.py run --backend local --embedder local-hash --rewrite none
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+QUERIES_JSON = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_queries.json")
+
+
+def count_tokens(text: str) -> int:
+    """Token count with tiktoken when installed, else the ~4 characters per token estimate."""
+    try:
+        import tiktoken
+    except ImportError:
+        return (len(text) + 3) // 4
+    return len(tiktoken.get_encoding("o200k_base").encode(text))
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers."""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    rank = max(1, int(round(pct / 100 * len(ordered))))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def load_queries(path=QUERIES_JSON):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)["queries"]
+
+
+def get_rewriter(mode):
+    """Return a function mapping a user query to the retrieval query."""
+    if mode == "none":
+        return lambda query: query
+    if mode == "llm":
+        from rag_chat import determine_retrieval_query
+        # Single-turn conversation, as the app sends it (the history includes the current message)
+        return lambda query: determine_retrieval_query(query, [{"role": "user", "content": query}])
+    raise ValueError(f"Unknown rewrite mode '{mode}'. Use 'none' or 'llm'")
+
+
+def score_query(retrieved_ids, relevant_ids):
+    """Return (recall@k, reciprocal rank) for one query."""
+    relevant = set(relevant_ids)
+    hits = [doc_id for doc_id in retrieved_ids if doc_id in relevant]
+    recall = len(set(hits)) / len(relevant) if relevant else 0.0
+    reciprocal_rank = 0.0
+    for rank, doc_id in enumerate(retrieved_ids, start=1):
+        if doc_id in relevant:
+            reciprocal_rank = 1.0 / rank
+            break
+    return recall, reciprocal_rank
+
+
+def run_benchmark(args):
+    # Backend and embedder are read from the environment at import time
+    if args.backend:
+        os.environ["VECTOR_BACKEND"] = args.backend
+    if args.embedder:
+        os.environ["EMBEDDING_MODEL"] = args.embedder
+
+    from embeddings import get_embedder
+    from retriever import retrieve_similar_chunks, get_index, VECTOR_BACKEND
+
+    rewrite = get_rewriter(args.rewrite)
+    queries = load_queries(args.queries)
+
+    # Connect / build the index up front so it is not charged to the first query
+    get_index()
+
+    results = []
+    for item in queries:
+        rewrite_ms, retrieve_ms = [], []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            retrieval_query = rewrite(item["query"])
+            rewritten = time.perf_counter()
+            chunks = retrieve_similar_chunks(retrieval_query, top_k=args.top_k)
+            done = time.perf_counter()
+            rewrite_ms.append((rewritten - start) * 1000)
+            retrieve_ms.append((done - rewritten) * 1000)
+
+        retrieved_ids = [chunk["id"] for chunk in chunks]
+        recall, reciprocal_rank = score_query(retrieved_ids, item["relevant"])
+        context_text = "\n\n".join(chunk["text"] for chunk in chunks)
+        results.append({
+            "query": item["query"],
+            "retrieval_query": retrieval_query,
+            "relevant": item["relevant"],
+            "retrieved": retrieved_ids,
+            "recall": recall,
+            "reciprocal_rank": reciprocal_rank,
+            "context_tokens": count_tokens(context_text),
+            "rewrite_ms": statistics.median(rewrite_ms),
+            "retrieve_ms": statistics.median(retrieve_ms),
+        })
+
+    total_ms = [r["rewrite_ms"] + r["retrieve_ms"] for r in results]
+    summary = {
+        "recall_at_k": statistics.mean(r["recall"] for r in results),
+        "mrr": statistics.mean(r["reciprocal_rank"] for r in results),
+        "context_tokens_mean": statistics.mean(r["context_tokens"] for r in results),
+        "context_tokens_max": max(r["context_tokens"] for r in results),
+        "latency_p50_ms": percentile(total_ms, 50),
+        "latency_p95_ms": percentile(total_ms, 95),
+        "latency_p99_ms": percentile(total_ms, 99),
+        "retrieve_p50_ms": percentile([r["retrieve_ms"] for r in results], 50),
+        "retrieve_p95_ms": percentile([r["retrieve_ms"] for r in results], 95),
+    }
+    report = {
+        "config": {
+            "backend": VECTOR_BACKEND,
+            "embedder": get_embedder().name,
+            "rewrite": args.rewrite,
+            "top_k": args.top_k,
+            "repeat": args.repeat,
+            "queries": len(queries),
+        },
+        "summary": summary,
+        "results": results,
+    }
+
+    print_report(report)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n💾 Saved results to {args.out}")
+    return report
+
+
+def print_report(report):
+    config = report["config"]
+    print(
+        f"📊 Retrieval benchmark: backend={config['backend']} embedder={config['embedder']} "
+        f"rewrite={config['rewrite']} top_k={config['top_k']} ({config['queries']} queries)\n"
+    )
+    for name, value in report["summary"].items():
+        print(f"   {name:<22} {value:10.3f}")
+
+    misses = [r for r in report["results"] if r["reciprocal_rank"] == 0]
+    if misses:
+        print(f"\n⚠️  {len(misses)} queries retrieved no relevant document:")
+        for r in misses:
+            print(f"   - '{r['query']}' -> {r['retrieved'][:3]}")
+
+
+def diff_reports(baseline_path, candidate_path):
+    """Print summary deltas and per-query recall and rank changes between two saved runs."""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(candidate_path, "r", encoding="utf-8") as f:
+        candidate = json.load(f)
+
+    print(f"📊 Diff: {baseline_path} -> {candidate_path}\n")
+    for key in sorted(set(baseline["config"]) | set(candidate["config"])):
+        old, new = baseline["config"].get(key), candidate["config"].get(key)
+        if old != new:
+            print(f"   config {key}: {old} -> {new}")
+
+    print(f"\n   {'metric':<22} {'baseline':>10} {'candidate':>10} {'delta':>10}")
+    for key in baseline["summary"]:
+        if key not in candidate["summary"]:
+            continue
+        old, new = baseline["summary"][key], candidate["summary"][key]
+        print(f"   {key:<22} {old:10.3f} {new:10.3f} {new - old:+10.3f}")
+
+    old_results = {r["query"]: r for r in baseline["results"]}
+    changed = []
+    for r in candidate["results"]:
+        old = old_results.get(r["query"])
+        if not old:
+            continue
+        recall_delta = r["recall"] - old["recall"]
+        rr_delta = r["reciprocal_rank"] - old["reciprocal_rank"]
+        # Recall can drop for multi-document queries while the first hit stays put, so track both
+        if recall_delta or rr_delta:
+            changed.append((recall_delta, rr_delta, r["query"], old, r))
+
+    if changed:
+        print(f"\n   Queries whose recall@k or first relevant rank changed ({len(changed)}):")
+        for recall_delta, rr_delta, query, old, new in sorted(changed, key=lambda c: (c[0] + c[1], c[2])):
+            if recall_delta >= 0 and rr_delta >= 0:
+                status = "✅ better"
+            elif recall_delta <= 0 and rr_delta <= 0:
+                status = "❌ worse"
+            else:
+                status = "↔️  mixed"
+            print(
+                f"   {status}: '{query}'  recall {old['recall']:.2f} -> {new['recall']:.2f}  "
+                f"RR {old['reciprocal_rank']:.2f} -> {new['reciprocal_rank']:.2f}"
+            )
+    else:
+        print("\n   No per-query recall or rank changes.")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="Run the benchmark against the configured backend")
+    run.add_argument("--top-k", type=int, default=5)
+    run.add_argument("--rewrite", choices=["none", "llm"], default="none")
+    run.add_argument("--backend", choices=["pinecone", "local"], help="Overrides VECTOR_BACKEND")
+    run.add_argument("--embedder", help="Overrides EMBEDDING_MODEL")
+    run.add_argument("--repeat", type=int, default=3, help="Timed repetitions per query (median is reported)")
+    run.add_argument("--queries", default=QUERIES_JSON)
+    run.add_argument("--out", help="Write the full report to this JSON file")
+
+    diff = commands.add_parser("diff", help="Compare two saved runs")
+    diff.add_argument("baseline")
+    diff.add_argument("candidate")
+
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        run_benchmark(args)
+    else:
+        diff_reports(args.baseline, args.candidate)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+"""
+Startup and rerun benchmark for the Streamlit app.
+
+Measures:
+  - cold import time of the app's dependencies (each in a fresh interpreter)
+  - per-rerun render time of app.py with a long chat history, windowed vs. fully rendered
+
+Usage:
+  python bench_startup.py [history_length] [reruns]
+"""
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+IMPORT_TARGETS = ["streamlit", "openai", "pinecone", "rag_chat"]
+
+
+def measure_import(module: str) -> float:
+    """Import `module` in a fresh interpreter and return the import time in milliseconds."""
+    code = (
+        "import time; t = time.perf_counter(); "
+        f"import {module}; "
+        "print((time.perf_counter() - t) * 1000)"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def make_history(length: int):
+    """Build a synthetic conversation of `length` messages."""
+    history = []
+    for i in range(length):
+        if i % 2 == 0:
+            history.append({"role": "user", "content": f"Question {i}: how should I take my medication?"})
+        else:
+            history.append({"role": "assistant", "content": f"Answer {i}: take it with meals and keep a routine. " * 5})
+    return history
+
+
+def measure_reruns(history_length: int, reruns: int, window: int):
+    """Render app.py `reruns` times with a seeded history and return per-rerun times in milliseconds."""
+    from streamlit.testing.v1 import AppTest
+
+    os.environ["HISTORY_WINDOW"] = str(window)
+    app = AppTest.from_file("app.py", default_timeout=60)
+    app.session_state["messages"] = make_history(history_length)
+
+    # First run compiles the script and populates caches; keep it out of the numbers
+    app.run()
+
+    timings = []
+    for _ in range(reruns):
+        start = time.perf_counter()
+        app.run()
+        timings.append((time.perf_counter() - start) * 1000)
+        if app.exception:
+            raise RuntimeError(app.exception[0].message)
+    return timings
+
+
+def summarize(timings):
+    timings = sorted(timings)
+    p95 = timings[min(len(timings) - 1, int(round(0.95 * (len(timings) - 1))))]
+    return f"mean {statistics.mean(timings):8.1f} ms | p50 {statistics.median(timings):8.1f} ms | p95 {p95:8.1f} ms"
+
+
+def main():
+    history_length = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+    reruns = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    print("📦 Cold import time (fresh interpreter):\n")
+    for module in IMPORT_TARGETS:
+        try:
+            print(f"   {module:<10} {measure_import(module):8.1f} ms")
+        except Exception as e:
+            print(f"   {module:<10} failed: {e}")
+
+    print(f"\n🔁 Rerun render time ({history_length} messages, {reruns} reruns):\n")
+    window = int(os.getenv("HISTORY_WINDOW", "20"))
+    for label, size in [(f"windowed ({window})", window), ("full history", history_length)]:
+        print(f"   {label:<16} {summarize(measure_reruns(history_length, reruns, size))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+# coalesce.py
+"""
+Single-flight request coalescing.
+
+Concurrent callers asking for the same key share one in-flight upstream call and all
+receive its result (or its exception). Works across threads and asyncio tasks in one
+process. Nothing is cached: once the call finishes, the next request starts a new one.
+"""
+import asyncio
+import json
+import re
+import threading
+from concurrent.futures import Future
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_text(text) -> str:
+    """Normalize user text for coalescing keys (case and whitespace insensitive)."""
+    return _WHITESPACE_RE.sub(" ", str(text)).strip().lower()
+
+
+def make_key(*parts) -> str:
+    """Build a stable key from JSON-serializable parts."""
+    return json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+
+
+class SingleFlight:
+    """Coalesces concurrent calls for the same key into one upstream call."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self.calls = 0       # upstream calls actually made
+        self.coalesced = 0   # calls saved by joining an in-flight request
+
+    def _join_or_lead(self, key):
+        """Return (future, is_leader) for `key`, registering a new in-flight call if none exists."""
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = Future()
+            # Mark it running so a cancelled waiter cannot cancel the shared call for everyone else
+            future.set_running_or_notify_cancel()
+            self._in_flight[key] = future
+            self.calls += 1
+            return future, True
+
+    def _run(self, key, future, fn, args, kwargs):
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def do(self, key, fn, *args, **kwargs):
+        """Call fn(*args, **kwargs), or wait for an identical in-flight call and return its result."""
+        future, is_leader = self._join_or_lead(key)
+        if is_leader:
+            self._run(key, future, fn, args, kwargs)
+        return future.result()
+
+    async def do_async(self, key, fn, *args, **kwargs):
+        """Async variant of do(); the blocking fn runs in the default executor, so the event loop stays free."""
+        future, is_leader = self._join_or_lead(key)
+        if is_leader:
+            loop = asyncio.get_running_loop()
+            loop.run_in_executor(None, self._run, key, future, fn, args, kwargs)
+        waiter = asyncio.wrap_future(future)
+        # Retrieve the outcome even if this task is cancelled, so asyncio does not log it as unretrieved
+        waiter.add_done_callback(lambda f: f.cancelled() or f.exception())
+        # Shield so cancelling this task (wait_for timeout, disconnect) only abandons this caller's wait
+        return await asyncio.shield(waiter)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"calls": self.calls, "coalesced": self.coalesced, "in_flight": len(self._in_flight)}
+
+
+# One coalescer per pipeline stage
+rewrite_flight = SingleFlight("rewrite")
+embedding_flight = SingleFlight("embedding")
+query_flight = SingleFlight("index_query")
+answer_flight = SingleFlight("answer")
+# Whole-request coalescing for asyncio callers (rag_chat.generate_answer_async)
+request_flight = SingleFlight("request")
+
+FLIGHTS = (request_flight, rewrite_flight, embedding_flight, query_flight, answer_flight)
+
+
+def coalescing_stats() -> dict:
+    """Per-stage counters: upstream calls made and calls saved by coalescing."""
+    return {flight.name: flight.stats() for flight in FLIGHTS}
+
+
+def log_coalescing_stats():
+    """Print upstream calls made and saved per stage."""
+    summary = ", ".join(
+        f"{name} {stats['coalesced']} saved/{stats['calls']} made"
+        for name, stats in coalescing_stats().items()
+        if stats["calls"]
+    )
+    print(f"🔗 Coalescing: {summary}")
@@ -0,0 +1,143 @@
+# embeddings.py
+"""
+Embedder interface shared by the indexing (vector_store.py) and query (retriever.py) paths.
+
+The backend is selected with the EMBEDDING_MODEL environment variable:
+  - "local-hash" / "local-hash-<dim>"  -> HashingEmbedder (CPU only, no network, no GPU)
+  - anything else                       -> OpenAIEmbedder using that OpenAI model name
+"""
+import os
+import re
+import zlib
+from functools import lru_cache
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DEFAULT_EMBEDDING_MODEL = "text-embedding-3-small"
+LOCAL_EMBEDDER_PREFIX = "local-hash"
+LOCAL_EMBEDDING_DIM = 384
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+# Function words carry no topical signal and would otherwise dominate short queries
+# Bias feature for texts that would otherwise embed to an all-zero vector
+_EMPTY_FEATURE = "#empty#"
+_STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i if in is it its me my of on or "
+    "should so that the their them this to was what when where which who why will with you your".split()
+)
+
+
+class Embedder:
+    """Base class for embedders. Subclasses implement embed() for a batch of texts."""
+
+    name = "embedder"
+    dimension = None
+
+    def embed(self, texts):
+        """Embed a list of texts, returning one vector (list of floats) per text."""
+        raise NotImplementedError
+
+    def embed_one(self, text):
+        """Embed a single text."""
+        return self.embed([text])[0]
+
+
+class OpenAIEmbedder(Embedder):
+    """Embeddings from the OpenAI embeddings API (requires network access and OPENAI_API_KEY)."""
+
+    def __init__(self, model=DEFAULT_EMBEDDING_MODEL):
+        self.model = model
+        self.name = model
+        self._client = None
+        self._dimension = None
+
+    @property
+    def client(self):
+        # Import lazily so the local embedder works without the openai package configured
+        if self._client is None:
+            from openai import OpenAI
+            self._client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        return self._client
+
+    def embed(self, texts):
+        # Avoid empty input to the embeddings API
+        inputs = [text.replace("\n", " ") if text else " " for text in texts]
+        response = self.client.embeddings.create(input=inputs, model=self.model)
+        return [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+
+    @property
+    def dimension(self):
+        # The API does not expose the dimension, so probe it once
+        if self._dimension is None:
+            self._dimension = len(self.embed_one("sample"))
+        return self._dimension
+
+
+class HashingEmbedder(Embedder):
+    """
+    Local CPU embedder: signed feature hashing of word unigrams, word bigrams and
+    character trigrams, with sublinear (log) term frequency and L2 normalisation.
+    Deterministic across processes, so an index built once can be queried anywhere.
+    """
+
+    def __init__(self, dimension=LOCAL_EMBEDDING_DIM):
+        self.dimension = int(dimension)
+        self.name = f"{LOCAL_EMBEDDER_PREFIX}-{self.dimension}"
+
+    @staticmethod
+    def _features(text):
+        tokens = _TOKEN_RE.findall(text.lower())
+        # Fall back to the unfiltered tokens for stopword-only text such as "what can I do?"
+        words = [w for w in tokens if w not in _STOPWORDS] or tokens
+        features = list(words)
+        features.extend(f"{a} {b}" for a, b in zip(words, words[1:]))
+        # Character trigrams give partial credit to plurals and spelling variants
+        for word in words:
+            padded = f"#{word}#"
+            features.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+        return features
+
+    def embed(self, texts):
+        rows, hashes = [], []
+        for row, text in enumerate(texts):
+            features = self._features(text or "")
+            rows.extend([row] * len(features))
+            hashes.extend(zlib.crc32(f.encode("utf-8")) for f in features)
+
+        hashes = np.asarray(hashes, dtype=np.uint32)
+        rows = np.asarray(rows, dtype=np.int64)
+        cols = (hashes % self.dimension).astype(np.int64)
+        # Use the top bit of the hash as the sign to reduce collision bias
+        signs = np.where(hashes >> 31, -1.0, 1.0)
+
+        matrix = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        np.add.at(matrix, (rows, cols), signs)
+
+        # Sublinear term frequency, keeping the sign of each bucket
+        matrix = np.sign(matrix) * np.log1p(np.abs(matrix))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        # Cosine indexes reject zero vectors. Rows with no tokens ("", "?!") or whose collisions
+        # cancelled out get a fixed bias feature instead
+        zero_rows = norms[:, 0] == 0
+        if zero_rows.any():
+            matrix[zero_rows, zlib.crc32(_EMPTY_FEATURE.encode("utf-8")) % self.dimension] = 1.0
+            norms[zero_rows] = 1.0
+        return (matrix / norms).tolist()
+
+
+@lru_cache(maxsize=None)
+def get_embedder(model=None):
+    """Return the embedder for `model`, defaulting to the EMBEDDING_MODEL environment variable."""
+    if model is None:
+        model = os.getenv("EMBEDDING_MODEL", DEFAULT_EMBEDDING_MODEL)
+
+    if model.startswith(LOCAL_EMBEDDER_PREFIX):
+        suffix = model[len(LOCAL_EMBEDDER_PREFIX):].lstrip("-")
+        if suffix and (not suffix.isdigit() or int(suffix) < 1):
+            raise ValueError(f"Invalid local embedder '{model}'. Use '{LOCAL_EMBEDDER_PREFIX}' or '{LOCAL_EMBEDDER_PREFIX}-<dim>'")
+        return HashingEmbedder(int(suffix) if suffix else LOCAL_EMBEDDING_DIM)
+
+    return OpenAIEmbedder(model)
@@ -0,0 +1,58 @@
+# local_index.py
+"""
+In-memory vector index over INPUT_JSON, queried with the same interface as a Pinecone index.
+Selected with VECTOR_BACKEND=local; combined with EMBEDDING_MODEL=local-hash it runs fully offline.
+"""
+import json
+import os
+from types import SimpleNamespace
+
+import numpy as np
+
+from embeddings import get_embedder
+from vector_store import prepare_documents, INPUT_JSON
+
+
+class LocalIndex:
+    """Exact cosine-similarity search over a NumPy matrix of document embeddings."""
+
+    def __init__(self, documents, embedder):
+        self.embedder = embedder
+        self.ids = [doc["id"] for doc in documents]
+        self.metadata = []
+        for doc in documents:
+            metadata = dict(doc["metadata"])
+            metadata["embedder"] = embedder.name
+            self.metadata.append(metadata)
+
+        vectors = np.asarray(embedder.embed([m.get("text", "") for m in self.metadata]), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        self.vectors = vectors / norms
+
+    @classmethod
+    def from_json(cls, path=INPUT_JSON, embedder=None):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Input JSON not found: {path}")
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(prepare_documents(data), embedder or get_embedder())
+
+    def query(self, vector, top_k=3, include_metadata=True):
+        """Return the top_k matches, shaped like a Pinecone query response."""
+        query = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        scores = self.vectors @ (query / norm if norm else query)
+
+        # Stable sort keeps tie order deterministic across runs
+        top = np.argsort(-scores, kind="stable")[:top_k]
+
+        matches = [
+            SimpleNamespace(
+                id=self.ids[i],
+                score=float(scores[i]),
+                metadata=self.metadata[i] if include_metadata else None,
+            )
+            for i in top
+        ]
+        return SimpleNamespace(matches=matches)
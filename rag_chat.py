@@ -1,21 +1,21 @@
 import os
+import threading
+import time
+from string import Template
 from openai import OpenAI
 from retriever import retrieve_similar_chunks
+from coalesce import (
+    rewrite_flight, answer_flight, request_flight, make_key, normalize_text, log_coalescing_stats
+)
 
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
-def determine_retrieval_query(user_query, history):
-    """
-    Use LLM to dynamically determine the best query for retrieval based on conversation context.
-    The LLM analyzes the conversation and determines what should be searched in the vector database.
-    """
-    # Convert history to chat format (skip system messages)
-    chat_history = [{"role": m["role"], "content": m["content"]} for m in history if m.get("role") != "system"]
-    
-    # Create a prompt for the LLM to determine the retrieval query
-    query_determination_prompt = {
-        "role": "system",
-        "content": """You are a query analyzer for a patient support information retrieval system. 
+# Static prompts are module-level constants so every request starts with a byte-identical
+# prefix (system instructions first, per-turn content last), which provider-side prompt
+# caching can reuse. Per-turn content is filled into precompiled templates.
+QUERY_ANALYZER_PROMPT = {
+    "role": "system",
+    "content": """You are a query analyzer for a patient support information retrieval system. 
 Your task is to analyze the conversation and determine the BEST search query to use for retrieving relevant information from the knowledge base.
 
 CRITICAL RULES:
@@ -67,15 +67,88 @@ IMPORTANT: For follow-up queries like "more info", ALWAYS extract the topic from
 IMPORTANT: Be specific - include disease names, medication names, or topic keywords.
 
 Return ONLY the search query, nothing else."""
-    }
+}
+
+QUERY_REQUEST_TEMPLATE = Template(
+    "Given the conversation above, what should be the search query for the current user message: '$user_query'?\n\n"
+    "Return ONLY the search query:"
+)
+
+ANSWER_SYSTEM_PROMPT = {
+    "role": "system",
+    "content": (
+        "You are a compassionate, empathetic, and supportive Patient Support Assistant. "
+        "Your role is to help patients understand their conditions, manage their medications, track symptoms, "
+        "navigate their health journey, and connect with support resources. "
+        "Use the entire conversation history and the provided context to give accurate, helpful, and reassuring answers.\n\n"
+
+        "CRITICAL: Response Style - Be CONCISE, CONFIDENT, and EMPATHETIC:\n"
+        "- Keep responses SHORT (2-4 sentences maximum, unless user explicitly asks for more)\n"
+        "- Be confident and direct - provide the essential information needed to answer the question\n"
+        "- Use warm, understanding language but keep it brief\n"
+        "- Acknowledge concerns briefly, then provide the answer\n"
+        "- Break down complex information into simple terms, but keep it concise\n"
+        "- Use 'you' and 'your' to personalize responses\n"
+        "- Do NOT add unnecessary explanations or verbose elaborations\n"
+        "- Do NOT dump raw data - provide concise, well-structured summaries\n"
+        "- Do NOT list multiple items unless the question specifically asks for a list\n\n"
+
+        "Response Guidelines (CONCISE):\n"
+        "- For disease education: Give key facts in 2-3 sentences. Full details only if asked.\n"
+        "- For medication questions: Explain how to take and key notes in 2-3 sentences. Full information only if asked.\n"
+        "- For adherence questions: Provide 2-3 practical tips. Full strategies only if asked.\n"
+        "- For symptom tracking: Explain what to track and red flags in 2-3 sentences. Full details only if asked.\n"
+        "- For journey questions: Briefly explain the stage in 2-3 sentences. Full journey details only if asked.\n"
+        "- For support programs: Mention available programs briefly. Full descriptions only if asked.\n\n"
+
+        "ELABORATION RULES:\n"
+        "- ONLY elaborate when user explicitly asks: 'more info', 'more details', 'tell me more', 'elaborate', 'explain more', 'give me more information', 'expand', 'detailed', 'full details'\n"
+        "- When user asks to elaborate, THEN provide additional relevant information, examples, or detailed explanations\n"
+        "- Default response should be SHORT and DIRECT - save detailed explanations for when explicitly requested\n\n"
+
+        "Safety and Medical Disclaimers:\n"
+        "- Always emphasize that you provide general information, not medical advice\n"
+        "- Encourage users to consult their healthcare provider for personalized advice\n"
+        "- For urgent symptoms or red flags, clearly state they should seek immediate medical attention\n"
+        "- Never diagnose or recommend specific treatments - only provide educational information\n\n"
+
+        "Conversation Flow:\n"
+        "- Greet warmly and ask how you can help\n"
+        "- Listen to concerns and provide relevant information\n"
+        "- Check understanding and offer additional help\n"
+        "- Be supportive throughout the conversation\n\n"
+
+        "Remember: Be CONCISE and DIRECT. Provide short, confident answers (2-4 sentences). "
+        "Only elaborate when the user explicitly asks for more information. "
+        "Be kind and supportive, but keep it brief. If information is not available in the context, say so briefly and suggest "
+        "they speak with their healthcare provider."
+    ),
+}
+
+CONTEXT_TEMPLATE = Template(
+    "Context from knowledge base for the latest user message:\n$context_text\n\n"
+    "Answer the latest user message using this context and the conversation above."
+)
+
+def determine_retrieval_query(user_query, history):
+    """
+    Use LLM to dynamically determine the best query for retrieval based on conversation context.
+    The LLM analyzes the conversation and determines what should be searched in the vector database.
+    """
+    # Convert history to chat format (skip system messages)
+    chat_history = [{"role": m["role"], "content": m["content"]} for m in history if m.get("role") != "system"]
     
     # Build messages for query determination
-    messages = [query_determination_prompt] + chat_history + [
-        {"role": "user", "content": f"Given the conversation above, what should be the search query for the current user message: '{user_query}'?\n\nReturn ONLY the search query:"}
+    messages = [QUERY_ANALYZER_PROMPT] + chat_history + [
+        {"role": "user", "content": QUERY_REQUEST_TEMPLATE.substitute(user_query=user_query)}
     ]
     
     try:
-        response = client.chat.completions.create(
+        # Identical concurrent rewrites (same history and question) share one completion
+        response = rewrite_flight.do(
+            conversation_key(messages),
+            complete_chat,
+            "rewrite",
             model="gpt-4o-mini",
             messages=messages,
             temperature=0.1,
@@ -100,59 +173,49 @@ Return ONLY the search query, nothing else."""
         print(f"⚠️  Error in LLM query determination: {e}. Using original query.")
         return user_query
 
-def create_system_prompt(context_text):
-    """Create the system prompt for the patient support assistant."""
-    return {
-        "role": "system",
-        "content": (
-            "You are a compassionate, empathetic, and supportive Patient Support Assistant. "
-            "Your role is to help patients understand their conditions, manage their medications, track symptoms, "
-            "navigate their health journey, and connect with support resources. "
-            "Use the entire conversation history and the provided context to give accurate, helpful, and reassuring answers.\n\n"
-
-            "CRITICAL: Response Style - Be CONCISE, CONFIDENT, and EMPATHETIC:\n"
-            "- Keep responses SHORT (2-4 sentences maximum, unless user explicitly asks for more)\n"
-            "- Be confident and direct - provide the essential information needed to answer the question\n"
-            "- Use warm, understanding language but keep it brief\n"
-            "- Acknowledge concerns briefly, then provide the answer\n"
-            "- Break down complex information into simple terms, but keep it concise\n"
-            "- Use 'you' and 'your' to personalize responses\n"
-            "- Do NOT add unnecessary explanations or verbose elaborations\n"
-            "- Do NOT dump raw data - provide concise, well-structured summaries\n"
-            "- Do NOT list multiple items unless the question specifically asks for a list\n\n"
-
-            "Response Guidelines (CONCISE):\n"
-            "- For disease education: Give key facts in 2-3 sentences. Full details only if asked.\n"
-            "- For medication questions: Explain how to take and key notes in 2-3 sentences. Full information only if asked.\n"
-            "- For adherence questions: Provide 2-3 practical tips. Full strategies only if asked.\n"
-            "- For symptom tracking: Explain what to track and red flags in 2-3 sentences. Full details only if asked.\n"
-            "- For journey questions: Briefly explain the stage in 2-3 sentences. Full journey details only if asked.\n"
-            "- For support programs: Mention available programs briefly. Full descriptions only if asked.\n\n"
-
-            "ELABORATION RULES:\n"
-            "- ONLY elaborate when user explicitly asks: 'more info', 'more details', 'tell me more', 'elaborate', 'explain more', 'give me more information', 'expand', 'detailed', 'full details'\n"
-            "- When user asks to elaborate, THEN provide additional relevant information, examples, or detailed explanations\n"
-            "- Default response should be SHORT and DIRECT - save detailed explanations for when explicitly requested\n\n"
-
-            "Safety and Medical Disclaimers:\n"
-            "- Always emphasize that you provide general information, not medical advice\n"
-            "- Encourage users to consult their healthcare provider for personalized advice\n"
-            "- For urgent symptoms or red flags, clearly state they should seek immediate medical attention\n"
-            "- Never diagnose or recommend specific treatments - only provide educational information\n\n"
-
-            "Conversation Flow:\n"
-            "- Greet warmly and ask how you can help\n"
-            "- Listen to concerns and provide relevant information\n"
-            "- Check understanding and offer additional help\n"
-            "- Be supportive throughout the conversation\n\n"
-
-            f"Context from knowledge base:\n{context_text}\n\n"
-            "Remember: Be CONCISE and DIRECT. Provide short, confident answers (2-4 sentences). "
-            "Only elaborate when the user explicitly asks for more information. "
-            "Be kind and supportive, but keep it brief. If information is not available in the context, say so briefly and suggest "
-            "they speak with their healthcare provider."
-        ),
-    }
+# Running per-stage token totals, used to verify cached-token savings
+PROMPT_USAGE = {}
+_usage_lock = threading.Lock()
+
+def complete_chat(stage, **kwargs):
+    """Call the chat completions API and log prompt, cached and completion token counts."""
+    start = time.perf_counter()
+    response = client.chat.completions.create(**kwargs)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    
+    usage = getattr(response, "usage", None)
+    prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+    completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached_tokens = getattr(details, "cached_tokens", 0) or 0
+    
+    with _usage_lock:
+        totals = PROMPT_USAGE.setdefault(stage, {
+            "calls": 0, "prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0, "latency_ms": 0.0
+        })
+        totals["calls"] += 1
+        totals["prompt_tokens"] += prompt_tokens
+        totals["cached_tokens"] += cached_tokens
+        totals["completion_tokens"] += completion_tokens
+        totals["latency_ms"] += elapsed_ms
+    
+    print(
+        f"📊 {stage}: prompt={prompt_tokens} cached={cached_tokens} "
+        f"completion={completion_tokens} tokens in {elapsed_ms:.0f} ms"
+    )
+    return response
+
+def conversation_key(messages):
+    """Coalescing key for a list of chat messages."""
+    return make_key([(m["role"], normalize_text(m["content"])) for m in messages])
+
+def create_system_prompt():
+    """Return the static system prompt for the patient support assistant."""
+    return ANSWER_SYSTEM_PROMPT
+
+def create_context_prompt(context_text):
+    """Create the per-turn message carrying the retrieved context (appended after the history)."""
+    return {"role": "system", "content": CONTEXT_TEMPLATE.substitute(context_text=context_text)}
 
 def generate_answer(user_query, history):
     """Generate context-aware answer using chat history and RAG."""
@@ -179,12 +242,15 @@ def generate_answer(user_query, history):
     
     # Convert Streamlit history to OpenAI chat format (exclude system messages from history)
     chat_history = [{"role": m["role"], "content": m["content"]} for m in history if m.get("role") != "system"]
-    system_prompt = create_system_prompt(context_text)
-    
-    messages = [system_prompt] + chat_history
+    # Static prefix first, then the conversation, then this turn's context
+    messages = [create_system_prompt()] + chat_history + [create_context_prompt(context_text)]
     
     try:
-        response = client.chat.completions.create(
+        # Identical concurrent prompts (same context and history) share one completion
+        response = answer_flight.do(
+            conversation_key(messages),
+            complete_chat,
+            "answer",
             model="gpt-4o-mini",
             messages=messages,
             temperature=0.3,  # Slightly higher for more natural, empathetic responses
@@ -196,4 +262,15 @@ def generate_answer(user_query, history):
     except Exception as e:
         print(f"⚠️  Error generating answer: {e}")
         return "I'm sorry, I'm having trouble responding right now. Please try again or contact your healthcare provider for immediate assistance."
+    finally:
+        log_coalescing_stats()
+
+async def generate_answer_async(user_query, history):
+    """
+    Async entry point for generate_answer.
+    Identical concurrent requests on the event loop share one pipeline run, which executes in a
+    worker thread (so the loop is not blocked) and still coalesces per stage with threaded callers.
+    """
+    key = conversation_key(list(history) + [{"role": "user", "content": user_query}])
+    return await request_flight.do_async(key, generate_answer, user_query, history)
 
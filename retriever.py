@@ -1,47 +1,89 @@
 import os
-from openai import OpenAI
+from functools import lru_cache
 from pinecone import Pinecone
 from dotenv import load_dotenv
+from embeddings import get_embedder
+from coalesce import embedding_flight, query_flight, make_key, normalize_text
 
 load_dotenv()
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
 # Pinecone setup
 PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
 PINECONE_INDEX_NAME = os.getenv("PINECONE_INDEX_NAME", "patient-vector")
-EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+
+# "pinecone" (default) or "local" (in-memory index built from INPUT_JSON, see local_index.py)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "pinecone")
 
 def get_embedding(text, model=None):
-    """Generate embedding for query."""
-    if model is None:
-        model = EMBEDDING_MODEL
-    text = text.replace("\n", " ")
-    response = client.embeddings.create(input=text, model=model)
-    return response.data[0].embedding
+    """Generate embedding for query (concurrent identical queries share one upstream call)."""
+    embedder = get_embedder(model)
+    key = make_key(embedder.name, normalize_text(text))
+    return embedding_flight.do(key, embedder.embed_one, text)
 
-def retrieve_similar_chunks(query, top_k=3):
-    """Retrieve top-k similar chunks for the given query using Pinecone."""
+@lru_cache(maxsize=1)
+def get_index():
+    """Connect to the configured index once and reuse it across queries."""
+    if VECTOR_BACKEND == "local":
+        from local_index import LocalIndex
+        return LocalIndex.from_json()
+    if VECTOR_BACKEND != "pinecone":
+        raise ValueError(f"Unknown VECTOR_BACKEND '{VECTOR_BACKEND}'. Use 'pinecone' or 'local'")
     if not PINECONE_API_KEY:
         raise ValueError("PINECONE_API_KEY not found in environment variables")
-    
-    query_embedding = get_embedding(query)
-    
-    # Initialize Pinecone and connect to index
     pc = Pinecone(api_key=PINECONE_API_KEY)
     index = pc.Index(name=PINECONE_INDEX_NAME)
     
-    # Query Pinecone for similar vectors
-    results = index.query(
+    # A dimension mismatch makes Pinecone reject every query before check_embedder can run,
+    # so catch it once here with the same actionable message
+    embedder = get_embedder()
+    index_stats = index.describe_index_stats()
+    index_dimension = index_stats.get("dimension")
+    if index_dimension and index_dimension != embedder.dimension:
+        raise embedder_mismatch_error(
+            f"an embedder with dimension {index_dimension}",
+            f"{embedder.name} (dimension {embedder.dimension})",
+        )
+    return index
+
+def embedder_mismatch_error(index_embedder, query_embedder):
+    return ValueError(
+        f"❌ Embedder mismatch!\n"
+        f"   Index '{PINECONE_INDEX_NAME}' was built with: {index_embedder}\n"
+        f"   Queries are embedded with: {query_embedder}\n\n"
+        f"   Set EMBEDDING_MODEL to the embedder that built the index, or rebuild the index with vector_store.py"
+    )
+
+def check_embedder(matches, embedder_name):
+    """Raise if the index was built with a different embedder than the one used for the query."""
+    for match in matches:
+        index_embedder = (match.metadata or {}).get("embedder")
+        # Indexes built before the embedder was recorded carry no tag; nothing to compare against
+        if index_embedder and index_embedder != embedder_name:
+            raise embedder_mismatch_error(index_embedder, embedder_name)
+
+def retrieve_similar_chunks(query, top_k=3):
+    """Retrieve top-k similar chunks for the given query from the configured index."""
+    index = get_index()
+    
+    embedder = get_embedder()
+    query_embedding = get_embedding(query)
+    
+    # Query the index for similar vectors; identical concurrent queries share one request
+    key = make_key(VECTOR_BACKEND, PINECONE_INDEX_NAME, embedder.name, normalize_text(query), top_k)
+    results = query_flight.do(
+        key,
+        index.query,
         vector=query_embedding,
         top_k=top_k,
         include_metadata=True
     )
+    check_embedder(results.matches, embedder.name)
     
     # Format results to match the original structure
     chunks = []
     for match in results.matches:
         chunks.append({
+            "id": match.id,
             "text": match.metadata.get("text", ""),
             "similarity": float(match.score)  # Pinecone returns cosine similarity as score
         })
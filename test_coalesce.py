@@ -0,0 +1,79 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from coalesce import SingleFlight
+
+
+def slow(value, delay=0.3):
+    time.sleep(delay)
+    return value
+
+
+def test_concurrent_threads_share_one_call():
+    flight = SingleFlight("test")
+    calls = []
+
+    def upstream():
+        calls.append(1)
+        return slow("ok")
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do("k", upstream))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == ["ok"] * 5
+    assert len(calls) == 1
+    assert flight.stats() == {"calls": 1, "coalesced": 4, "in_flight": 0}
+
+
+def test_exception_reaches_every_caller():
+    flight = SingleFlight("test")
+
+    def upstream():
+        time.sleep(0.1)
+        raise KeyError("boom")
+
+    async def main():
+        return await asyncio.gather(*[flight.do_async("k", upstream) for _ in range(3)], return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(r, KeyError) for r in results)
+    assert flight.stats()["calls"] == 1
+
+
+def test_cancelled_async_waiter_does_not_affect_thread_leader():
+    flight = SingleFlight("test")
+    leader_result = []
+    leader = threading.Thread(target=lambda: leader_result.append(flight.do("k", slow, "ok")))
+    leader.start()
+    time.sleep(0.05)
+
+    async def waiter():
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(flight.do_async("k", slow, "ok"), 0.1)
+
+    asyncio.run(waiter())
+    leader.join()
+    assert leader_result == ["ok"]
+
+
+def test_cancelled_async_waiter_does_not_affect_other_waiters():
+    flight = SingleFlight("test")
+
+    async def main():
+        first = asyncio.ensure_future(flight.do_async("k", slow, "ok"))
+        second = asyncio.ensure_future(flight.do_async("k", slow, "ok"))
+        await asyncio.sleep(0.05)
+        second.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await second
+        return await first
+
+    assert asyncio.run(main()) == "ok"
+    assert flight.stats() == {"calls": 1, "coalesced": 1, "in_flight": 0}
@@ -0,0 +1,28 @@
+import numpy as np
+import pytest
+
+from embeddings import HashingEmbedder, get_embedder
+
+
+@pytest.mark.parametrize("dimension", [1, 16, 384])
+def test_every_row_has_nonzero_norm(dimension):
+    texts = ["", "   ", "?!", "how do I", "what can I do?", "is it?", "how do I take metformin"]
+    vectors = np.asarray(HashingEmbedder(dimension).embed(texts))
+    assert vectors.shape == (len(texts), dimension)
+    assert np.allclose(np.linalg.norm(vectors, axis=1), 1.0)
+
+
+def test_embedding_is_deterministic():
+    embedder = HashingEmbedder()
+    assert embedder.embed_one("asthma inhaler") == HashingEmbedder().embed_one("asthma inhaler")
+
+
+@pytest.mark.parametrize("model", ["local-hash-0", "local-hash-abc"])
+def test_invalid_local_embedder_is_rejected(model):
+    with pytest.raises(ValueError):
+        get_embedder(model)
+
+
+def test_local_embedder_dimension_from_name():
+    assert get_embedder("local-hash-64").dimension == 64
+    assert get_embedder("local-hash").name == "local-hash-384"
@@ -2,14 +2,14 @@
 import json
 import os
 from dotenv import load_dotenv
-from openai import OpenAI
 from pinecone import Pinecone, ServerlessSpec, CloudProvider, AwsRegion
+from embeddings import get_embedder
 
 load_dotenv()
 
-# OpenAI client
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+# Embedder (OpenAI or local, selected by EMBEDDING_MODEL)
+embedder = get_embedder()
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
 
 # Pinecone setup
 PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
@@ -133,104 +133,22 @@ def build_text_for_embedding(item: dict, item_type: str, item_id: str) -> str:
 
 def create_embedding(text: str):
     """Generate an embedding vector for a given text."""
-    if not text:
-        text = " "  # avoid empty input to embeddings API
-    resp = client.embeddings.create(model=EMBEDDING_MODEL, input=text)
-    return resp.data[0].embedding
+    return embedder.embed_one(text)
 
-def get_aws_region(region_string: str):
-    """Get AwsRegion enum value from string, with fallback."""
-    region_map = {
-        "us-east-1": AwsRegion.US_EAST_1,
-        "us-west-2": AwsRegion.US_WEST_2,
-        "eu-west-1": AwsRegion.EU_WEST_1,
-    }
-    
-    if region_string in region_map:
-        return region_map[region_string]
-    
-    try:
-        enum_name = region_string.replace("-", "_").upper()
-        if hasattr(AwsRegion, enum_name):
-            return getattr(AwsRegion, enum_name)
-    except Exception:
-        pass
-    
-    print(f"⚠️  Region '{region_string}' not found, defaulting to us-east-1")
-    return AwsRegion.US_EAST_1
-
-def store_embeddings():
-    """Store embeddings in Pinecone index."""
-    if not PINECONE_API_KEY:
-        raise ValueError("PINECONE_API_KEY not found in environment variables")
-    
-    # Initialize Pinecone
-    pc = Pinecone(api_key=PINECONE_API_KEY)
-    
-    # Get embedding dimension from OpenAI model
-    print(f"Getting embedding dimension for model: {EMBEDDING_MODEL}")
-    sample_embedding = create_embedding("sample")
-    embedding_dimension = len(sample_embedding)
-    print(f"✅ Embedding dimension: {embedding_dimension}")
-    
-    # Check if index exists, create if not
-    existing_indexes = [index.name for index in pc.list_indexes()]
-    
-    if PINECONE_INDEX_NAME not in existing_indexes:
-        print(f"Creating Pinecone index: {PINECONE_INDEX_NAME}")
-        
-        aws_region = get_aws_region(PINECONE_REGION)
-        
-        pc.create_index(
-            name=PINECONE_INDEX_NAME,
-            dimension=embedding_dimension,
-            metric="cosine",
-            spec=ServerlessSpec(
-                cloud=CloudProvider.AWS,
-                region=aws_region
-            )
-        )
-        print(f"✅ Index {PINECONE_INDEX_NAME} created successfully with dimension {embedding_dimension}!")
-    else:
-        print(f"✅ Index {PINECONE_INDEX_NAME} already exists")
-        index_stats = pc.describe_index(PINECONE_INDEX_NAME)
-        index_dimension = index_stats.dimension
-        
-        if index_dimension != embedding_dimension:
-            raise ValueError(
-                f"❌ Dimension mismatch!\n"
-                f"   Index '{PINECONE_INDEX_NAME}' has dimension: {index_dimension}\n"
-                f"   Embedding model '{EMBEDDING_MODEL}' produces dimension: {embedding_dimension}\n\n"
-                f"   Solutions:\n"
-                f"   1. Use a different index name (set PINECONE_INDEX_NAME in .env)\n"
-                f"   2. Delete the existing index and recreate it\n"
-                f"   3. Use an embedding model that matches the index dimension\n"
-            )
-        else:
-            print(f"✅ Index dimension ({index_dimension}) matches embedding dimension ({embedding_dimension})")
-    
-    # Connect to index
-    index = pc.Index(name=PINECONE_INDEX_NAME)
-    
-    # Load JSON
-    if not os.path.exists(INPUT_JSON):
-        raise FileNotFoundError(f"Input JSON not found: {INPUT_JSON}")
-    
-    with open(INPUT_JSON, "r", encoding="utf-8") as f:
-        data = json.load(f)
-    
-    # Prepare vectors for batch upsert
-    vectors_to_upsert = []
-    
-    doc_count = 0
+def prepare_documents(data: dict, verbose: bool = False):
+    """
+    Build the list of {id, metadata} documents (text in metadata) from the patient data JSON.
+    Set verbose to print a progress line per data section (used by store_embeddings).
+    """
+    documents = []
     
     # Process Patient Education data
     if "patient_education" in data:
-        print("\nProcessing Patient Education data...")
+        if verbose:
+            print("\nProcessing Patient Education data...")
         for disease, info in data["patient_education"].items():
             uid = f"edu_{disease}"
             text = build_text_for_embedding(info, "patient_education", disease)
-            embedding = create_embedding(text)
             
             metadata = {
                 "type": "patient_education",
@@ -241,20 +159,18 @@ def store_embeddings():
             # Remove None values
             metadata = {k: v for k, v in metadata.items() if v is not None and v != ""}
             
-            vectors_to_upsert.append({
+            documents.append({
                 "id": uid,
-                "values": embedding,
                 "metadata": metadata
             })
-            doc_count += 1
     
     # Process Adherence Tools data
     if "adherence_tools" in data:
-        print("\nProcessing Adherence Tools data...")
+        if verbose:
+            print("\nProcessing Adherence Tools data...")
         for tool_type, tool_info in data["adherence_tools"].items():
             uid = f"adherence_{tool_type}"
             text = build_text_for_embedding(tool_info, "adherence_tools", tool_type)
-            embedding = create_embedding(text)
             
             metadata = {
                 "type": "adherence_tools",
@@ -263,21 +179,19 @@ def store_embeddings():
             }
             metadata = {k: v for k, v in metadata.items() if v is not None and v != ""}
             
-            vectors_to_upsert.append({
+            documents.append({
                 "id": uid,
-                "values": embedding,
                 "metadata": metadata
             })
-            doc_count += 1
     
     # Process Symptom Tracking data
     if "symptom_tracking" in data:
-        print("\nProcessing Symptom Tracking data...")
+        if verbose:
+            print("\nProcessing Symptom Tracking data...")
         if "common_symptoms" in data["symptom_tracking"]:
             for condition, symptom_info in data["symptom_tracking"]["common_symptoms"].items():
                 uid = f"symptom_{condition}"
                 text = build_text_for_embedding(symptom_info, "symptom_tracking", condition)
-                embedding = create_embedding(text)
                 
                 metadata = {
                     "type": "symptom_tracking",
@@ -286,21 +200,19 @@ def store_embeddings():
                 }
                 metadata = {k: v for k, v in metadata.items() if v is not None and v != ""}
                 
-                vectors_to_upsert.append({
+                documents.append({
                     "id": uid,
-                    "values": embedding,
                     "metadata": metadata
                 })
-                doc_count += 1
-    
+        
     # Process Patient Journey data
     if "patient_journey" in data:
-        print("\nProcessing Patient Journey data...")
+        if verbose:
+            print("\nProcessing Patient Journey data...")
         for journey_type, stages in data["patient_journey"].items():
             for stage_name, stage_info in stages.items():
                 uid = f"journey_{journey_type}_{stage_name}"
                 text = build_text_for_embedding(stage_info, "patient_journey", stage_name)
-                embedding = create_embedding(text)
                 
                 metadata = {
                     "type": "patient_journey",
@@ -310,20 +222,18 @@ def store_embeddings():
                 }
                 metadata = {k: v for k, v in metadata.items() if v is not None and v != ""}
                 
-                vectors_to_upsert.append({
+                documents.append({
                     "id": uid,
-                    "values": embedding,
                     "metadata": metadata
                 })
-                doc_count += 1
-    
+        
     # Process Support Programs data
     if "support_programs" in data:
-        print("\nProcessing Support Programs data...")
+        if verbose:
+            print("\nProcessing Support Programs data...")
         for program_type, program_info in data["support_programs"].items():
             uid = f"support_{program_type}"
             text = build_text_for_embedding(program_info, "support_programs", program_type)
-            embedding = create_embedding(text)
             
             metadata = {
                 "type": "support_programs",
@@ -332,12 +242,109 @@ def store_embeddings():
             }
             metadata = {k: v for k, v in metadata.items() if v is not None and v != ""}
             
-            vectors_to_upsert.append({
+            documents.append({
                 "id": uid,
-                "values": embedding,
                 "metadata": metadata
             })
-            doc_count += 1
+    
+    return documents
+
+def get_aws_region(region_string: str):
+    """Get AwsRegion enum value from string, with fallback."""
+    region_map = {
+        "us-east-1": AwsRegion.US_EAST_1,
+        "us-west-2": AwsRegion.US_WEST_2,
+        "eu-west-1": AwsRegion.EU_WEST_1,
+    }
+    
+    if region_string in region_map:
+        return region_map[region_string]
+    
+    try:
+        enum_name = region_string.replace("-", "_").upper()
+        if hasattr(AwsRegion, enum_name):
+            return getattr(AwsRegion, enum_name)
+    except Exception:
+        pass
+    
+    print(f"⚠️  Region '{region_string}' not found, defaulting to us-east-1")
+    return AwsRegion.US_EAST_1
+
+def store_embeddings():
+    """Store embeddings in Pinecone index."""
+    if not PINECONE_API_KEY:
+        raise ValueError("PINECONE_API_KEY not found in environment variables")
+    
+    # Initialize Pinecone
+    pc = Pinecone(api_key=PINECONE_API_KEY)
+    
+    # Get embedding dimension from the configured embedder
+    print(f"Getting embedding dimension for embedder: {embedder.name}")
+    embedding_dimension = embedder.dimension
+    print(f"✅ Embedding dimension: {embedding_dimension}")
+    
+    # Check if index exists, create if not
+    existing_indexes = [index.name for index in pc.list_indexes()]
+    
+    if PINECONE_INDEX_NAME not in existing_indexes:
+        print(f"Creating Pinecone index: {PINECONE_INDEX_NAME}")
+        
+        aws_region = get_aws_region(PINECONE_REGION)
+        
+        pc.create_index(
+            name=PINECONE_INDEX_NAME,
+            dimension=embedding_dimension,
+            metric="cosine",
+            spec=ServerlessSpec(
+                cloud=CloudProvider.AWS,
+                region=aws_region
+            )
+        )
+        print(f"✅ Index {PINECONE_INDEX_NAME} created successfully with dimension {embedding_dimension}!")
+    else:
+        print(f"✅ Index {PINECONE_INDEX_NAME} already exists")
+        index_stats = pc.describe_index(PINECONE_INDEX_NAME)
+        index_dimension = index_stats.dimension
+        
+        if index_dimension != embedding_dimension:
+            raise ValueError(
+                f"❌ Dimension mismatch!\n"
+                f"   Index '{PINECONE_INDEX_NAME}' has dimension: {index_dimension}\n"
+                f"   Embedder '{embedder.name}' produces dimension: {embedding_dimension}\n\n"
+                f"   Solutions:\n"
+                f"   1. Use a different index name (set PINECONE_INDEX_NAME in .env)\n"
+                f"   2. Delete the existing index and recreate it\n"
+                f"   3. Use an embedding model that matches the index dimension\n"
+            )
+        else:
+            print(f"✅ Index dimension ({index_dimension}) matches embedding dimension ({embedding_dimension})")
+    
+    # Connect to index
+    index = pc.Index(name=PINECONE_INDEX_NAME)
+    
+    # Load JSON
+    if not os.path.exists(INPUT_JSON):
+        raise FileNotFoundError(f"Input JSON not found: {INPUT_JSON}")
+    
+    with open(INPUT_JSON, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    
+    # Prepare documents, then embed them in batches (one API call / one matrix op per batch)
+    documents = prepare_documents(data, verbose=True)
+    doc_count = len(documents)
+    
+    vectors_to_upsert = []
+    for i in range(0, doc_count, EMBED_BATCH_SIZE):
+        batch = documents[i:i + EMBED_BATCH_SIZE]
+        embeddings = embedder.embed([doc["metadata"].get("text", "") for doc in batch])
+        for doc, embedding in zip(batch, embeddings):
+            # Record which embedder built each vector so retriever.py can catch mismatches at query time
+            doc["metadata"]["embedder"] = embedder.name
+            vectors_to_upsert.append({
+                "id": doc["id"],
+                "values": embedding,
+                "metadata": doc["metadata"]
+            })
     
     print(f"\nTotal documents prepared: {doc_count}")
     